@@ -142,6 +142,9 @@ class BackendStack(Stack):
         secret_ep = api.root.add_resource("secret")
         secret_ep.add_method("PUT", apigw.LambdaIntegration(backend_lambda))
 
+        secret_batch_ep = secret_ep.add_resource("batch")
+        secret_batch_ep.add_method("PUT", apigw.LambdaIntegration(backend_lambda))
+
         secret_get_ep = secret_ep.add_resource("{secret_id}")
         secret_get_ep.add_method("GET", apigw.LambdaIntegration(backend_lambda))
 
@@ -149,6 +152,9 @@ class BackendStack(Stack):
         file_ep_new = file_ep.add_resource("new")
         file_ep_new.add_method("GET", apigw.LambdaIntegration(backend_lambda))
 
+        file_ep_new_batch = file_ep_new.add_resource("batch")
+        file_ep_new_batch.add_method("GET", apigw.LambdaIntegration(backend_lambda))
+
         # store the API endpoint into a parameter store value
         ssm.CfnParameter(
             self,
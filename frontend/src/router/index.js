@@ -25,6 +25,11 @@ const router = createRouter({
       component: () => import("../views/GetSecretView.vue"),
       props: true,
     },
+    {
+      path: "/kdf-benchmark",
+      name: "kdf.benchmark",
+      component: () => import("../views/KdfBenchmarkView.vue"),
+    },
     {
       path: "/404", component: () => import("../views/404.vue"),
     },
@@ -9,6 +9,30 @@ export const CHUNK_SIZE = 16 * 1024 * 1024; // 16 MiB
 export const GCM_TAG_BYTES = 16; // WebCrypto AES-GCM default 128-bit tag
 export const PBKDF2_ITERATIONS = 600000; // OWASP-recommended floor for PBKDF2-HMAC-SHA256
 
+// Key derivation descriptors are stored alongside each secret's salt/iv so the
+// scheme can change without breaking outstanding links. Mirrors the KDF checks
+// in src/snapsecret.py - keep in sync.
+export const KDF_DESCRIPTOR_VERSION = 1;
+export const KDF_SCHEMES = {
+    "pbkdf2-sha256": {
+        version: KDF_DESCRIPTOR_VERSION,
+        algorithm: "PBKDF2",
+        hash: "SHA-256",
+        iterations: PBKDF2_ITERATIONS,
+    },
+    // OWASP-recommended floor for PBKDF2-HMAC-SHA512
+    "pbkdf2-sha512": {
+        version: KDF_DESCRIPTOR_VERSION,
+        algorithm: "PBKDF2",
+        hash: "SHA-512",
+        iterations: 210000,
+    },
+};
+// Secrets stored without a descriptor were derived with this scheme.
+export const LEGACY_KDF = KDF_SCHEMES["pbkdf2-sha256"];
+// Scheme used (and stored) for newly created secrets.
+export const DEFAULT_KDF = KDF_SCHEMES["pbkdf2-sha256"];
+
 // chunkIv = fileIvPrefix (8 bytes) || big-endian uint32 chunk index (4 bytes)
 // Never stored: both sides derive it from fileIvPrefix + loop counter.
 export function buildChunkIv(fileIvPrefix, index) {
@@ -18,7 +42,10 @@ export function buildChunkIv(fileIvPrefix, index) {
     return iv;
 }
 
-export async function getKey(passphrase, salt) {
+export async function getKey(passphrase, salt, kdf = LEGACY_KDF) {
+    if (kdf.version !== KDF_DESCRIPTOR_VERSION || kdf.algorithm !== "PBKDF2") {
+        throw new Error(`Unsupported key derivation scheme: ${kdf.algorithm} v${kdf.version}`);
+    }
     const keyMaterial = await window.crypto.subtle.importKey(
         "raw",
         enc.encode(passphrase),
@@ -30,8 +57,8 @@ export async function getKey(passphrase, salt) {
         {
             name: "PBKDF2",
             salt: salt,
-            iterations: PBKDF2_ITERATIONS,
-            hash: "SHA-256",
+            iterations: kdf.iterations,
+            hash: kdf.hash,
         },
         keyMaterial,
         { name: "AES-GCM", length: 256 },
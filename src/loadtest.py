@@ -0,0 +1,510 @@
+"""Closed-loop load generator for the snapsecret Lambda handler
+
+Drives `snapsecret.handler` from several processes against local DynamoDB and S3
+stand-ins that inject configurable latency and throttling errors, then reports
+throughput, error rates and latency histograms per operation.
+
+The stand-ins replace boto3 entirely, so botocore's retries are modelled by the
+DynamoDB stand-in itself: throttled calls are retried the way botocore's default
+(legacy) retry mode does for DynamoDB, up to --sdk-max-attempts attempts with
+50 ms exponential backoff, and only surface as request errors once exhausted.
+
+Each process owns its own in-memory table, so secrets are only ever retrieved by
+the process that created them.
+
+Example:
+    python loadtest.py --processes 4 --duration 30 \\
+        --mix create=4,create_batch=1,retrieve=4,burned=1,file_new=1 \\
+        --dynamodb-latency lognormal:8:0.5 --throttle-rate 0.01
+"""
+
+from multiprocessing import Pool
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+import snapsecret
+
+OPERATIONS = ("create", "create_batch", "retrieve", "burned", "file_new")
+
+# botocore's legacy retry mode retries throttled DynamoDB calls up to 10 attempts in
+# total, sleeping SDK_RETRY_BASE_SECONDS * 2 ** (attempt - 1) between attempts.
+SDK_MAX_ATTEMPTS = 10
+SDK_RETRY_BASE_SECONDS = 0.05
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyModel:
+    """Samples injected latency (in seconds) from a distribution described by a spec
+
+    Supported specs (all values in milliseconds):
+        none, fixed:<ms>, uniform:<min>:<max>, exponential:<mean>,
+        lognormal:<median>:<sigma>
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        name, *params = spec.split(":")
+        self.name = name
+        self.rng = rng
+
+        try:
+            self.params = [float(param) for param in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+        valid_params = {
+            "none": lambda: True,
+            "fixed": lambda ms: ms >= 0,
+            "uniform": lambda low, high: 0 <= low <= high,
+            "exponential": lambda mean: mean > 0,
+            "lognormal": lambda median, sigma: median > 0 and sigma >= 0,
+        }
+        try:
+            valid = valid_params[name](*self.params)
+        except (KeyError, TypeError):
+            valid = False
+        if not valid:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        if self.name == "fixed":
+            ms = self.params[0]
+        elif self.name == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.name == "exponential":
+            ms = self.rng.expovariate(1 / self.params[0])
+        elif self.name == "lognormal":
+            ms = self.rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        else:
+            ms = 0
+
+        return ms / 1000
+
+
+class StandInTable:
+    """In-memory stand-in for a DynamoDB Table resource"""
+
+    def __init__(self, resource: "StandInDynamoDB", name: str):
+        self.resource = resource
+        self.name = name
+
+    def put_item(self, Item: dict) -> dict:
+        self.resource.call("PutItem")
+        with self.resource.lock:
+            self.resource.items[Item["secret_id"]] = Item
+        return {}
+
+    def delete_item(self, Key: dict, ReturnValues: str = "NONE") -> dict:
+        self.resource.call("DeleteItem")
+        with self.resource.lock:
+            item = self.resource.items.pop(Key["secret_id"], None)
+        if item is not None and ReturnValues == "ALL_OLD":
+            return {"Attributes": item}
+        return {}
+
+
+class StandInDynamoDB:
+    """In-memory stand-in for the DynamoDB service resource
+
+    Every attempt sleeps for a sampled latency and is throttled with probability
+    `throttle_rate`. Throttled attempts are retried like botocore would, up to
+    `sdk_max_attempts` attempts, before the throttling error is raised.
+    BatchWriteItem additionally leaves each put request unprocessed with probability
+    `unprocessed_rate`.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        rng: random.Random,
+        throttle_rate: float = 0.0,
+        unprocessed_rate: float = 0.0,
+        sdk_max_attempts: int = SDK_MAX_ATTEMPTS,
+    ):
+        self.latency = latency
+        self.rng = rng
+        self.throttle_rate = throttle_rate
+        self.unprocessed_rate = unprocessed_rate
+        self.sdk_max_attempts = sdk_max_attempts
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def call(self, operation: str):
+        for attempt in range(1, self.sdk_max_attempts + 1):
+            time.sleep(self.latency.sample())
+            if self.rng.random() >= self.throttle_rate:
+                return
+            if attempt < self.sdk_max_attempts:
+                time.sleep(SDK_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+
+        raise ClientError(
+            {
+                "Error": {
+                    "Code": "ProvisionedThroughputExceededException",
+                    "Message": "Injected throttling error",
+                }
+            },
+            operation,
+        )
+
+    def Table(self, name: str) -> StandInTable:
+        return StandInTable(self, name)
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        self.call("BatchWriteItem")
+        unprocessed = {}
+        with self.lock:
+            for table_name, requests in RequestItems.items():
+                for request in requests:
+                    if self.rng.random() < self.unprocessed_rate:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    item = request["PutRequest"]["Item"]
+                    self.items[item["secret_id"]] = item
+        return {"UnprocessedItems": unprocessed}
+
+
+class StandInS3:
+    """Stand-in for the S3 client that only mints fake presigned urls"""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, **kwargs) -> str:
+        time.sleep(self.latency.sample())
+        return (
+            f"https://{Params['Bucket']}.s3.local/{Params['Key']}?method={ClientMethod}"
+        )
+
+    def generate_presigned_post(self, Bucket: str, Key: str, **kwargs) -> dict:
+        time.sleep(self.latency.sample())
+        return {"url": f"https://{Bucket}.s3.local/", "fields": {"key": Key}}
+
+
+class StandInBoto3:
+    """Replaces the `boto3` module used by snapsecret with the local stand-ins"""
+
+    def __init__(self, dynamodb: StandInDynamoDB, s3: StandInS3):
+        self.dynamodb = dynamodb
+        self.s3 = s3
+
+    def resource(self, service_name: str, **kwargs):
+        if service_name != "dynamodb":
+            raise ValueError(f"No stand-in for resource: {service_name}")
+        return self.dynamodb
+
+    def client(self, service_name: str, **kwargs):
+        if service_name != "s3":
+            raise ValueError(f"No stand-in for client: {service_name}")
+        return self.s3
+
+
+def parse_mix(mix: str) -> dict:
+    """Parses a traffic mix such as `create=4,retrieve=4,burned=1,file_new=1`
+
+    Args:
+        mix (str): Comma separated operation=weight pairs
+
+    Returns:
+        The weight for each operation
+    """
+    weights = {}
+    for pair in mix.split(","):
+        operation, _, weight = pair.partition("=")
+        try:
+            weights[operation] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid traffic mix entry: {pair}")
+        if operation not in OPERATIONS or not (
+            math.isfinite(weights[operation]) and weights[operation] >= 0
+        ):
+            raise ValueError(f"Invalid traffic mix entry: {pair}")
+
+    if not sum(weights.values()) > 0:
+        raise ValueError(f"Invalid traffic mix: {mix}")
+
+    return weights
+
+
+def run_workload(
+    weights: dict, duration: float, rng: random.Random, batch_size: int = 10
+) -> dict:
+    """Calls snapsecret.handler in a closed loop until `duration` seconds elapse
+
+    Retrieve and burned re-read operations fall back to a create when there is no
+    suitable secret id available yet. A create_batch request counts as an error if
+    any of its secrets could not be stored.
+
+    Args:
+        weights (dict): The weight for each operation, as returned by parse_mix
+        duration (float): How long to generate load for, in seconds
+        rng (random.Random): The random source used to pick operations
+        batch_size (int, optional): The number of secrets per create_batch request
+
+    Returns:
+        Per operation stats: request count, error counts by kind and latencies (s)
+    """
+    operations = list(weights.keys())
+    operation_weights = list(weights.values())
+    stats = {
+        operation: {"requests": 0, "errors": {}, "latencies": []}
+        for operation in OPERATIONS
+    }
+
+    unread_ids = []
+    burned_ids = []
+
+    valid_secret = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA=="}
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights=operation_weights)[0]
+        if operation == "retrieve" and not unread_ids:
+            operation = "create"
+        if operation == "burned" and not burned_ids:
+            operation = "create"
+
+        event = {"headers": {}}
+        expected_status = 200
+        if operation == "create":
+            event.update(
+                path="/secret",
+                httpMethod="PUT",
+                body=json.dumps({"secret": valid_secret}),
+            )
+        elif operation == "create_batch":
+            event.update(
+                path="/secret/batch",
+                httpMethod="PUT",
+                body=json.dumps({"secrets": [valid_secret] * batch_size}),
+            )
+        elif operation == "file_new":
+            event.update(path="/file/new", httpMethod="GET")
+        else:
+            if operation == "retrieve":
+                secret_id = unread_ids.pop(rng.randrange(len(unread_ids)))
+            else:
+                secret_id = rng.choice(burned_ids)
+                expected_status = 404
+            event.update(
+                path=f"/secret/{secret_id}",
+                httpMethod="GET",
+                pathParameters={"secret_id": secret_id},
+            )
+
+        error = None
+        start = time.perf_counter()
+        try:
+            response = snapsecret.handler(event, None)
+            if response["statusCode"] != expected_status:
+                error = f"HTTP {response['statusCode']}"
+            elif operation == "create_batch":
+                results = json.loads(response["body"])["secrets"]
+                unread_ids += [r["secret_id"] for r in results if "secret_id" in r]
+                if item_errors := [r["error"] for r in results if "error" in r]:
+                    error = item_errors[0]
+        except ClientError as e:
+            error = e.response["Error"]["Code"]
+        except Exception as e:
+            error = type(e).__name__
+        latency = time.perf_counter() - start
+
+        operation_stats = stats[operation]
+        operation_stats["requests"] += 1
+        operation_stats["latencies"].append(latency)
+        if error:
+            operation_stats["errors"][error] = (
+                operation_stats["errors"].get(error, 0) + 1
+            )
+            continue
+
+        if operation == "create":
+            unread_ids.append(json.loads(response["body"])["secret_id"])
+        elif operation == "retrieve":
+            burned_ids.append(secret_id)
+
+    return stats
+
+
+def run_worker(options: dict) -> dict:
+    """Entry point for each load generating process
+
+    Args:
+        options (dict): The parsed command line options, plus a per-worker `seed`
+
+    Returns:
+        The stats returned by run_workload
+    """
+    rng = random.Random(options["seed"])
+
+    os.environ.setdefault("SECRETS_TABLE", "secrets-table")
+    os.environ.setdefault("SECRETS_BUCKET", "secrets-bucket")
+    snapsecret.boto3 = StandInBoto3(
+        dynamodb=StandInDynamoDB(
+            latency=LatencyModel(options["dynamodb_latency"], rng),
+            rng=rng,
+            throttle_rate=options["throttle_rate"],
+            unprocessed_rate=options["unprocessed_rate"],
+            sdk_max_attempts=options["sdk_max_attempts"],
+        ),
+        s3=StandInS3(latency=LatencyModel(options["s3_latency"], rng)),
+    )
+
+    return run_workload(
+        parse_mix(options["mix"]), options["duration"], rng, options["batch_size"]
+    )
+
+
+def merge_stats(results: list) -> dict:
+    merged = {
+        operation: {"requests": 0, "errors": {}, "latencies": []}
+        for operation in OPERATIONS
+    }
+    for stats in results:
+        for operation, operation_stats in stats.items():
+            merged[operation]["requests"] += operation_stats["requests"]
+            merged[operation]["latencies"] += operation_stats["latencies"]
+            for error, count in operation_stats["errors"].items():
+                errors = merged[operation]["errors"]
+                errors[error] = errors.get(error, 0) + count
+
+    return merged
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def format_report(stats: dict, duration: float) -> str:
+    """Formats merged stats as a plain text report
+
+    Args:
+        stats (dict): The merged per operation stats
+        duration (float): The duration of the run, in seconds
+
+    Returns:
+        The report
+    """
+    total_requests = sum(operation["requests"] for operation in stats.values())
+    total_errors = sum(
+        sum(operation["errors"].values()) for operation in stats.values()
+    )
+    lines = [
+        f"Duration: {duration:.1f}s",
+        f"Requests: {total_requests} ({total_requests / duration:.1f} req/s)",
+        f"Errors: {total_errors} ({total_errors / max(total_requests, 1):.2%})",
+    ]
+
+    for operation, operation_stats in stats.items():
+        requests = operation_stats["requests"]
+        if not requests:
+            continue
+
+        latencies = sorted(latency * 1000 for latency in operation_stats["latencies"])
+        errors = sum(operation_stats["errors"].values())
+        lines += [
+            "",
+            f"[{operation}] {requests} requests ({requests / duration:.1f} req/s), "
+            f"{errors} errors ({errors / requests:.2%})",
+            "  latency ms: "
+            + ", ".join(
+                f"p{int(fraction * 100)}={percentile(latencies, fraction):.1f}"
+                for fraction in (0.5, 0.9, 0.99)
+            )
+            + f", max={latencies[-1]:.1f}",
+        ]
+        for error, count in sorted(operation_stats["errors"].items()):
+            lines.append(f"  error {error}: {count}")
+
+        counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for latency in latencies:
+            bucket = 0
+            while (
+                bucket < len(HISTOGRAM_BUCKETS_MS)
+                and latency > HISTOGRAM_BUCKETS_MS[bucket]
+            ):
+                bucket += 1
+            counts[bucket] += 1
+
+        labels = [f"<= {bound} ms" for bound in HISTOGRAM_BUCKETS_MS]
+        labels.append(f"> {HISTOGRAM_BUCKETS_MS[-1]} ms")
+        for label, count in zip(labels, counts):
+            if count:
+                bar = "#" * max(1, round(40 * count / requests))
+                lines.append(f"  {label:>12} {count:>8} {bar}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument(
+        "--mix",
+        default="create=4,create_batch=1,retrieve=4,burned=1,file_new=1",
+        help="operation=weight pairs (operations: %s)" % ", ".join(OPERATIONS),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10,
+        help="number of secrets per create_batch request",
+    )
+    parser.add_argument("--dynamodb-latency", default="lognormal:8:0.5")
+    parser.add_argument("--s3-latency", default="none")
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="probability that a DynamoDB call attempt is throttled",
+    )
+    parser.add_argument(
+        "--sdk-max-attempts",
+        type=int,
+        default=SDK_MAX_ATTEMPTS,
+        help="attempts per DynamoDB call before a throttling error surfaces "
+        "(1 disables the modelled SDK retries)",
+    )
+    parser.add_argument(
+        "--unprocessed-rate",
+        type=float,
+        default=0.0,
+        help="probability that BatchWriteItem leaves a put request unprocessed "
+        "(affects create_batch requests)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Validate the specs up front rather than failing inside every worker
+    if not 1 <= args.batch_size <= snapsecret.MAX_BATCH_SIZE:
+        parser.error(f"--batch-size must be between 1 and {snapsecret.MAX_BATCH_SIZE}")
+    if args.sdk_max_attempts < 1:
+        parser.error("--sdk-max-attempts must be at least 1")
+    try:
+        parse_mix(args.mix)
+        LatencyModel(args.dynamodb_latency, random.Random())
+        LatencyModel(args.s3_latency, random.Random())
+    except ValueError as e:
+        parser.error(str(e))
+
+    options = [
+        {**vars(args), "seed": args.seed + worker} for worker in range(args.processes)
+    ]
+    with Pool(args.processes) as pool:
+        results = pool.map(run_worker, options)
+
+    print(format_report(merge_stats(results), args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 from typing import Union
 import base64
 import json
 import os
 import secrets
+import time
 import boto3
 import logging
 
@@ -26,6 +28,48 @@ MAX_FILE_SIZE_BYTES = 1024 * 1024 * 1024  # 1 GiB
 # DynamoDB record backing it is already burned by the time it's issued.
 DELETE_URL_EXPIRATION_SECONDS = 5 * 60
 
+# Upper bound on the number of secrets accepted by a single PUT /secret/batch request.
+MAX_BATCH_SIZE = 100
+
+# Upper bound on the number of entries in a secret bundle, and therefore on the number
+# of upload slots minted by a single GET /file/new/batch request. The whole bundle is
+# stored as a single DynamoDB item, so it must also fit within the 400 KB item size
+# limit.
+MAX_BUNDLE_ENTRIES = 20
+
+# Key derivation descriptors ("kdf") stored alongside a secret's salt/iv tell the
+# frontend how to derive the decryption key. Secrets without one were encrypted with
+# PBKDF2-SHA256 at 600,000 iterations. Mirrors KDF_SCHEMES in
+# frontend/src/utils/fileCrypto.js - keep in sync.
+KDF_DESCRIPTOR_VERSION = 1
+# Minimum PBKDF2 iterations for each supported hash, per OWASP recommendations.
+PBKDF2_MIN_ITERATIONS = {"SHA-256": 600000, "SHA-512": 210000}
+PBKDF2_MAX_ITERATIONS = 10000000
+
+# DynamoDB rejects items larger than 400 KB. A BatchWriteItem call containing such an
+# item fails as a whole, so oversized secrets are rejected before being written.
+MAX_ITEM_SIZE_BYTES = 400 * 1024
+
+# BatchWriteItem accepts at most 25 put requests per call.
+BATCH_WRITE_CHUNK_SIZE = 25
+
+# Unprocessed items returned by BatchWriteItem are retried with exponential backoff
+# (BATCH_WRITE_BACKOFF_SECONDS * 2 ** attempt) before being reported as failed.
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+
+# No further BatchWriteItem calls (or backoff sleeps) are started once less than this
+# much of the Lambda invocation's time remains, so the response listing the stored
+# ids is still returned instead of the invocation timing out.
+BATCH_WRITE_MIN_REMAINING_MS = 1000
+
+
+def json_default(value):
+    """Serialises the Decimal numbers returned by DynamoDB for json.dumps"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
 
 def build_response(
     event: dict, status_code: int = 200, body: Union[str, dict] = None
@@ -56,7 +100,7 @@ def build_response(
     if body and type(body) is str:
         response["body"] = body
     elif body and type(body) is dict:
-        response["body"] = json.dumps(body)
+        response["body"] = json.dumps(body, default=json_default)
 
     return response
 
@@ -101,6 +145,96 @@ def store_secret_value(value: str) -> str:
     return secret_id
 
 
+def store_secret_values(values: list, context=None) -> list:
+    """Stores several secret values into the DynamoDB table using BatchWriteItem
+
+    Items left unprocessed by DynamoDB (e.g. due to throttling) are retried with
+    exponential backoff, up to BATCH_WRITE_MAX_ATTEMPTS times per chunk. If a chunk
+    fails outright, only the secrets in that chunk are reported as not stored.
+    Writing stops early when the Lambda invocation is about to time out, and any
+    secrets not yet written are reported as not stored.
+
+    Args:
+        values (list): The secret values to store
+        context (optional): The Lambda context, used to check the remaining time
+
+    Returns:
+        The ids that were used to store each secret, in the same order as `values`.
+        An id is None if the secret could not be stored.
+    """
+
+    dynamodb: DynamoDBServiceResource = boto3.resource("dynamodb")
+    table_name = os.environ.get("SECRETS_TABLE")
+
+    expires_at = get_unix_timestamp(add_hours=24)
+    secret_ids = [secrets.token_urlsafe(32) for _ in values]
+    unstored = set()
+
+    for start in range(0, len(values), BATCH_WRITE_CHUNK_SIZE):
+        requests = [
+            {
+                "PutRequest": {
+                    "Item": {
+                        "secret_id": secret_id,
+                        "expires_at": expires_at,
+                        "value": value,
+                    }
+                }
+            }
+            for secret_id, value in zip(
+                secret_ids[start : start + BATCH_WRITE_CHUNK_SIZE],
+                values[start : start + BATCH_WRITE_CHUNK_SIZE],
+            )
+        ]
+
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            backoff = BATCH_WRITE_BACKOFF_SECONDS * 2**attempt if attempt else 0
+            if (
+                context
+                and context.get_remaining_time_in_millis() - backoff * 1000
+                < BATCH_WRITE_MIN_REMAINING_MS
+            ):
+                break
+            if backoff:
+                time.sleep(backoff)
+
+            try:
+                response = dynamodb.batch_write_item(
+                    RequestItems={table_name: requests}
+                )
+            except ClientError as e:
+                logging.error(e)
+                break
+
+            requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not requests:
+                break
+
+        for request in requests:
+            unstored.add(request["PutRequest"]["Item"]["secret_id"])
+
+    if unstored:
+        logging.error("Failed to store %d of %d secrets", len(unstored), len(values))
+
+    return [None if secret_id in unstored else secret_id for secret_id in secret_ids]
+
+
+def is_within_item_size_limit(value) -> bool:
+    """Checks if a secret value fits within the DynamoDB item size limit
+
+    The JSON encoded length is used as a conservative estimate of the DynamoDB item
+    size, which also counts attribute names and a few bytes of overhead per element.
+
+    Args:
+        value: The secret value to check
+
+    Returns:
+        True if the secret value can be stored, False otherwise
+    """
+    item = {"secret_id": "x" * 43, "expires_at": get_unix_timestamp(), "value": value}
+    return len(json.dumps(item, default=json_default).encode()) <= MAX_ITEM_SIZE_BYTES
+
+
 def retrieve_secret_value(secret_id: str) -> str:
     """Retrieves the secret value from the DynamoDB table
     This will also delete the item from the table if it exists
@@ -146,14 +280,76 @@ def is_base64(input: str) -> bool:
         return False
 
 
-def get_secret_file(event: dict, secret: dict) -> dict:
-    get_url = get_s3_presigned_url("GET", secret["object_key"])
-    delete_url = get_s3_presigned_url(
-        "DELETE", secret["object_key"], expiration=DELETE_URL_EXPIRATION_SECONDS
+def sign_secret_file(secret: dict, s3_client=None) -> dict:
+    """Adds presigned GET and DELETE urls for the file secret's S3 object
+
+    Args:
+        secret (dict): The file secret (or bundle file entry) holding an `object_key`
+        s3_client (optional): The S3 client to sign with, created if not provided
+
+    Returns:
+        The secret with `get_url` and `delete_url` set
+    """
+    s3_client = s3_client or get_s3_client()
+
+    secret["get_url"] = get_s3_presigned_url(
+        "GET", secret["object_key"], s3_client=s3_client
+    )
+    secret["delete_url"] = get_s3_presigned_url(
+        "DELETE",
+        secret["object_key"],
+        expiration=DELETE_URL_EXPIRATION_SECONDS,
+        s3_client=s3_client,
+    )
+
+    return secret
+
+
+def is_valid_kdf(kdf: dict) -> bool:
+    """Checks if the key derivation descriptor is a supported scheme with safe parameters
+
+    Args:
+        kdf (dict): The key derivation descriptor, e.g.
+            {"version": 1, "algorithm": "PBKDF2", "hash": "SHA-256", "iterations": 600000}
+
+    Returns:
+        True if the descriptor is valid, False otherwise
+    """
+    if type(kdf) is not dict:
+        return False
+    if kdf.keys() != {"version", "algorithm", "hash", "iterations"}:
+        return False
+
+    return (
+        type(kdf["version"]) is int
+        and kdf["version"] == KDF_DESCRIPTOR_VERSION
+        and kdf["algorithm"] == "PBKDF2"
+        and type(kdf["hash"]) is str
+        and kdf["hash"] in PBKDF2_MIN_ITERATIONS
+        and type(kdf["iterations"]) is int
+        and PBKDF2_MIN_ITERATIONS[kdf["hash"]]
+        <= kdf["iterations"]
+        <= PBKDF2_MAX_ITERATIONS
     )
 
-    secret["get_url"] = get_url
-    secret["delete_url"] = delete_url
+
+def get_secret_file(event: dict, secret: dict) -> dict:
+    return build_response(event=event, body={"secret": sign_secret_file(secret)})
+
+
+def get_secret_bundle(event: dict, secret: dict) -> dict:
+    """Builds the response for a secret bundle, signing urls for every file entry
+
+    Args:
+        event (dict): The event that triggered the Lambda function
+        secret (dict): The secret bundle
+    """
+    # Creating an S3 client costs far more than presigning with one, so a single
+    # client is shared across every file entry
+    s3_client = get_s3_client()
+    for entry in secret["entries"]:
+        if {"object_key", "iv", "file_name"} <= entry.keys():
+            sign_secret_file(entry, s3_client=s3_client)
 
     return build_response(event=event, body={"secret": secret})
 
@@ -173,6 +369,8 @@ def get_secret(event: dict):
         return build_response(event=event, status_code=404)
 
     if secret := retrieve_secret_value(secret_id):
+        if {"entries", "salt"} <= secret.keys():
+            return get_secret_bundle(event=event, secret=secret)
         if {"object_key", "iv", "salt", "file_name"} <= secret.keys():
             return get_secret_file(event=event, secret=secret)
         return build_response(event=event, body={"secret": secret})
@@ -180,24 +378,36 @@ def get_secret(event: dict):
     return build_response(event=event, status_code=404)
 
 
-def put_secret(event: dict) -> dict:
-    """Handles the HTTP response for a PUT request to the /secret/ endpoint
+def validate_secret_value(secret_value: dict) -> Union[str, None]:
+    """Validates an encrypted secret value submitted by the client
 
     Args:
-        event (dict): The event that triggered the Lambda function
+        secret_value (dict): The secret value to validate
+
+    Returns:
+        An error message if the secret value is invalid, None otherwise
     """
 
-    post_data = json.loads(event["body"])
+    if (
+        type(secret_value) is dict
+        and "kdf" in secret_value
+        and not is_valid_kdf(secret_value["kdf"])
+    ):
+        return "Invalid secret value"
+
+    if type(secret_value) is dict and "entries" in secret_value:
+        return validate_secret_bundle(secret_value)
 
     # Check if secret.secret, secret.iv, secret.salt was provided
-    secret_value = post_data.get("secret")
-    if not secret_value or (
-        not {"secret", "iv", "salt"} <= secret_value.keys()
-        and not {"object_key", "iv", "salt", "file_name"} <= secret_value.keys()
-    ):
-        return build_response(
-            event=event, status_code=400, body={"error": "Missing secret value"}
+    if (
+        not secret_value
+        or type(secret_value) is not dict
+        or (
+            not {"secret", "iv", "salt"} <= secret_value.keys()
+            and not {"object_key", "iv", "salt", "file_name"} <= secret_value.keys()
         )
+    ):
+        return "Missing secret value"
     # check if base64 string
     if (
         {"secret", "iv", "salt"} <= secret_value.keys()
@@ -209,7 +419,8 @@ def put_secret(event: dict) -> dict:
     ) or (
         {"object_key", "iv", "salt", "file_name"} <= secret_value.keys()
         and not (
-            secret_value["object_key"].replace("-", "").replace("_", "").isalnum()
+            type(secret_value["object_key"]) is str
+            and secret_value["object_key"].replace("-", "").replace("_", "").isalnum()
             and is_base64(secret_value["iv"])
             and is_base64(secret_value["salt"])
             and is_base64(secret_value["file_name"])
@@ -219,8 +430,66 @@ def put_secret(event: dict) -> dict:
             )
         )
     ):
+        return "Invalid secret value"
+
+    return None
+
+
+def validate_secret_bundle(secret_value: dict) -> Union[str, None]:
+    """Validates a secret bundle submitted by the client
+
+    A bundle shares a single `salt` (and optional `kdf`) across its `entries`, each
+    of which is either a text secret (`secret`, `iv`) or a file secret (`object_key`,
+    `iv`, `file_name`) validated with the same rules as a standalone secret.
+
+    Args:
+        secret_value (dict): The secret bundle to validate
+
+    Returns:
+        An error message if the secret bundle is invalid, None otherwise
+    """
+
+    entries = secret_value.get("entries")
+    if not secret_value.get("salt") or not entries or type(entries) is not list:
+        return "Missing secret value"
+    if len(entries) > MAX_BUNDLE_ENTRIES or not is_base64(secret_value["salt"]):
+        return "Invalid secret value"
+
+    for entry in entries:
+        if type(entry) is not dict or {"salt", "kdf", "entries"} & entry.keys():
+            return "Invalid secret value"
+        # Every entry holding an object_key is signed on retrieval, so it must be a
+        # complete file secret whose key passes the file secret checks
+        if (
+            "object_key" in entry
+            and not {"object_key", "iv", "file_name"} <= entry.keys()
+        ):
+            return "Invalid secret value"
+        if error := validate_secret_value({**entry, "salt": secret_value["salt"]}):
+            return error
+
+    object_keys = [entry["object_key"] for entry in entries if "object_key" in entry]
+    if len(set(object_keys)) != len(object_keys):
+        return "Invalid secret value"
+
+    return None
+
+
+def put_secret(event: dict) -> dict:
+    """Handles the HTTP response for a PUT request to the /secret/ endpoint
+
+    Args:
+        event (dict): The event that triggered the Lambda function
+    """
+
+    post_data = json.loads(event["body"])
+
+    secret_value = post_data.get("secret")
+    if error := validate_secret_value(secret_value):
+        return build_response(event=event, status_code=400, body={"error": error})
+    if not is_within_item_size_limit(secret_value):
         return build_response(
-            event=event, status_code=400, body={"error": "Invalid secret value"}
+            event=event, status_code=400, body={"error": "Secret value too large"}
         )
 
     secret_id = store_secret_value(secret_value)
@@ -228,6 +497,54 @@ def put_secret(event: dict) -> dict:
     return build_response(event=event, body={"secret_id": secret_id})
 
 
+def put_secret_batch(event: dict, context=None) -> dict:
+    """Handles the HTTP response for a PUT request to the /secret/batch endpoint
+
+    Each secret is validated with the same rules as a single PUT /secret/ request.
+    The response lists one result per submitted secret, in order, containing either
+    its `secret_id` or an `error`.
+
+    Args:
+        event (dict): The event that triggered the Lambda function
+        context (optional): The Lambda context, used to check the remaining time
+    """
+
+    post_data = json.loads(event["body"])
+
+    secret_values = post_data.get("secrets")
+    if not secret_values or type(secret_values) is not list:
+        return build_response(
+            event=event, status_code=400, body={"error": "Missing secret values"}
+        )
+    if len(secret_values) > MAX_BATCH_SIZE:
+        return build_response(
+            event=event,
+            status_code=400,
+            body={"error": f"Too many secret values (maximum {MAX_BATCH_SIZE})"},
+        )
+
+    results = [
+        {"error": error} if (error := validate_secret_value(secret_value)) else None
+        for secret_value in secret_values
+    ]
+    for index, secret_value in enumerate(secret_values):
+        if results[index] is None and not is_within_item_size_limit(secret_value):
+            results[index] = {"error": "Secret value too large"}
+
+    valid_indexes = [index for index, result in enumerate(results) if result is None]
+    secret_ids = store_secret_values(
+        [secret_values[index] for index in valid_indexes], context=context
+    )
+
+    for index, secret_id in zip(valid_indexes, secret_ids):
+        if secret_id is None:
+            results[index] = {"error": "Failed to store secret value"}
+        else:
+            results[index] = {"secret_id": secret_id}
+
+    return build_response(event=event, body={"secrets": results})
+
+
 def get_new_file(event: dict) -> dict:
     object_key = secrets.token_urlsafe(32)
     post = get_s3_presigned_post(object_key)
@@ -235,8 +552,43 @@ def get_new_file(event: dict) -> dict:
     return build_response(event=event, body={"post": post, "object_key": object_key})
 
 
+def get_new_file_batch(event: dict) -> dict:
+    """Handles the HTTP response for a GET request to the /file/new/batch endpoint
+
+    Mints `count` object keys, each with its own presigned POST, so the file entries
+    of a secret bundle can be uploaded concurrently.
+
+    Args:
+        event (dict): The event that triggered the Lambda function
+    """
+    count = (event.get("queryStringParameters") or {}).get("count", "")
+    if not count.isdecimal() or not 1 <= int(count) <= MAX_BUNDLE_ENTRIES:
+        return build_response(
+            event=event,
+            status_code=400,
+            body={"error": f"count must be between 1 and {MAX_BUNDLE_ENTRIES}"},
+        )
+
+    s3_client = get_s3_client()
+    files = []
+    for _ in range(int(count)):
+        object_key = secrets.token_urlsafe(32)
+        files.append(
+            {
+                "post": get_s3_presigned_post(object_key, s3_client=s3_client),
+                "object_key": object_key,
+            }
+        )
+
+    return build_response(event=event, body={"files": files})
+
+
+def get_s3_client():
+    return boto3.client("s3", config=Config(signature_version="s3v4"))
+
+
 def get_s3_presigned_url(
-    method: str, object_key: str, expiration: int = 4 * 3600
+    method: str, object_key: str, expiration: int = 4 * 3600, s3_client=None
 ) -> str:
     bucket = os.environ.get("SECRETS_BUCKET")
 
@@ -245,7 +597,7 @@ def get_s3_presigned_url(
         "DELETE": "delete_object",
     }
 
-    s3_client = boto3.client("s3", config=Config(signature_version="s3v4"))
+    s3_client = s3_client or get_s3_client()
     try:
         response = s3_client.generate_presigned_url(
             ClientMethod=client_methods[method],
@@ -259,13 +611,15 @@ def get_s3_presigned_url(
     return response
 
 
-def get_s3_presigned_post(object_key: str, expiration: int = 4 * 3600) -> dict:
+def get_s3_presigned_post(
+    object_key: str, expiration: int = 4 * 3600, s3_client=None
+) -> dict:
     """Mints a presigned S3 POST policy that caps the uploaded object at
     MAX_FILE_SIZE_BYTES, enforced by S3 itself rather than by the client.
     """
     bucket = os.environ.get("SECRETS_BUCKET")
 
-    s3_client = boto3.client("s3", config=Config(signature_version="s3v4"))
+    s3_client = s3_client or get_s3_client()
     try:
         response = s3_client.generate_presigned_post(
             Bucket=bucket,
@@ -286,12 +640,16 @@ def handler(event: dict, context: dict) -> dict:
             return get_secret(event)
 
         if event["httpMethod"] == "PUT":
+            if event["path"].rstrip("/") == "/secret/batch":
+                return put_secret_batch(event, context)
             return put_secret(event)
 
     if event["path"].startswith("/file"):
         """Handles the HTTP response for requests to the /file/ endpoint"""
 
         if event["httpMethod"] == "GET":
+            if event["path"].rstrip("/") == "/file/new/batch":
+                return get_new_file_batch(event)
             return get_new_file(event)
 
     return build_response(event=event, status_code=405)
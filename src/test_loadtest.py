@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+import loadtest
+import snapsecret
+
+
+def install_stand_ins(monkeypatch, rng, **kwargs):
+    monkeypatch.setattr(
+        snapsecret,
+        "boto3",
+        loadtest.StandInBoto3(
+            dynamodb=loadtest.StandInDynamoDB(
+                latency=loadtest.LatencyModel("none", rng), rng=rng, **kwargs
+            ),
+            s3=loadtest.StandInS3(latency=loadtest.LatencyModel("none", rng)),
+        ),
+    )
+
+
+def test_run_workload_exercises_every_operation_without_errors(monkeypatch):
+    rng = random.Random(0)
+    install_stand_ins(monkeypatch, rng)
+
+    stats = loadtest.run_workload(
+        loadtest.parse_mix("create=4,create_batch=1,retrieve=4,burned=1,file_new=1"),
+        0.2,
+        rng,
+    )
+
+    for operation in loadtest.OPERATIONS:
+        assert stats[operation]["requests"] > 0
+        assert stats[operation]["errors"] == {}
+
+
+def test_run_workload_reports_throttling_errors(monkeypatch):
+    rng = random.Random(0)
+    install_stand_ins(monkeypatch, rng, throttle_rate=1.0, sdk_max_attempts=1)
+
+    stats = loadtest.run_workload(loadtest.parse_mix("create=1"), 0.1, rng)
+
+    assert stats["create"]["errors"] == {
+        "ProvisionedThroughputExceededException": stats["create"]["requests"]
+    }
+
+
+def test_store_secret_values_retries_unprocessed_stand_in_writes(monkeypatch):
+    rng = random.Random(0)
+    install_stand_ins(monkeypatch, rng, unprocessed_rate=0.5)
+    monkeypatch.setattr(snapsecret.time, "sleep", lambda seconds: None)
+
+    secret_ids = snapsecret.store_secret_values(["a"] * 10)
+
+    assert None not in secret_ids
+    assert len(snapsecret.boto3.dynamodb.items) == 10
+
+
+def test_run_workload_retries_unprocessed_batch_writes(monkeypatch):
+    rng = random.Random(0)
+    install_stand_ins(monkeypatch, rng, unprocessed_rate=0.5)
+    monkeypatch.setattr(snapsecret.time, "sleep", lambda seconds: None)
+
+    dynamodb = snapsecret.boto3.dynamodb
+    batch_write_item = dynamodb.batch_write_item
+    calls = []
+    monkeypatch.setattr(
+        dynamodb,
+        "batch_write_item",
+        lambda **kwargs: calls.append(kwargs) or batch_write_item(**kwargs),
+    )
+
+    stats = loadtest.run_workload(
+        loadtest.parse_mix("create_batch=1,retrieve=1"), 0.1, rng
+    )
+
+    assert stats["create_batch"]["requests"] > 0
+    assert len(calls) > stats["create_batch"]["requests"]
+    assert stats["retrieve"]["errors"] == {}
+
+
+def test_stand_in_retries_throttled_calls_like_botocore(monkeypatch):
+    rng = random.Random(0)
+    dynamodb = loadtest.StandInDynamoDB(
+        latency=loadtest.LatencyModel("none", rng),
+        rng=rng,
+        throttle_rate=1.0,
+        sdk_max_attempts=3,
+    )
+    sleeps = []
+    monkeypatch.setattr(loadtest.time, "sleep", sleeps.append)
+
+    with pytest.raises(loadtest.ClientError):
+        dynamodb.call("PutItem")
+
+    assert [seconds for seconds in sleeps if seconds] == [0.05, 0.1]
+
+
+@pytest.mark.parametrize(
+    "spec",
+    ["fixed:-1", "uniform:-5:10", "uniform:10:5", "exponential:0", "lognormal:0:1"],
+)
+def test_latency_model_rejects_invalid_values(spec):
+    with pytest.raises(ValueError):
+        loadtest.LatencyModel(spec, random.Random())
+
+
+@pytest.mark.parametrize(
+    "mix",
+    ["create=-1,retrieve=2", "create=nan", "create=inf", "create=", "unknown=1"],
+)
+def test_parse_mix_rejects_invalid_weights(mix):
+    with pytest.raises(ValueError):
+        loadtest.parse_mix(mix)
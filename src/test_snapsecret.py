@@ -1,11 +1,14 @@
+import json
 import os
 from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import pytest
+from botocore.exceptions import ClientError
 from moto import mock_aws
 
 os.environ.setdefault("SECRETS_TABLE", "secrets-table")
+os.environ.setdefault("SECRETS_BUCKET", "secrets-bucket")
 os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
 
 import snapsecret  # noqa: E402
@@ -62,3 +65,412 @@ def test_concurrent_retrieve_only_succeeds_once(dynamodb_table):
 
     assert len(successes) == 1
     assert len(failures) == 1
+
+
+def put_event(path: str, body: dict) -> dict:
+    return {
+        "path": path,
+        "httpMethod": "PUT",
+        "headers": {},
+        "body": json.dumps(body),
+    }
+
+
+def test_put_secret_batch_returns_ids_in_order_with_errors(dynamodb_table):
+    valid = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA=="}
+    response = snapsecret.handler(
+        put_event(
+            "/secret/batch",
+            {
+                "secrets": [
+                    valid,
+                    {"secret": "not base64!", "iv": "aXY=", "salt": "c2FsdA=="},
+                    {},
+                    valid,
+                ]
+            },
+        ),
+        None,
+    )
+
+    assert response["statusCode"] == 200
+    results = json.loads(response["body"])["secrets"]
+    assert results[1] == {"error": "Invalid secret value"}
+    assert results[2] == {"error": "Missing secret value"}
+    assert results[0]["secret_id"] != results[3]["secret_id"]
+    for result in (results[0], results[3]):
+        assert snapsecret.retrieve_secret_value(result["secret_id"]) == valid
+
+
+def test_put_secret_batch_reports_non_string_object_key(dynamodb_table):
+    valid = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA=="}
+    invalid = {"object_key": 5, "iv": "aXY=", "salt": "c2FsdA==", "file_name": "YQ=="}
+    response = snapsecret.handler(
+        put_event("/secret/batch", {"secrets": [valid, invalid]}), None
+    )
+
+    assert response["statusCode"] == 200
+    results = json.loads(response["body"])["secrets"]
+    assert "secret_id" in results[0]
+    assert results[1] == {"error": "Invalid secret value"}
+
+
+def test_put_secret_batch_rejects_oversized_batch(dynamodb_table):
+    valid = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA=="}
+    response = snapsecret.handler(
+        put_event(
+            "/secret/batch", {"secrets": [valid] * (snapsecret.MAX_BATCH_SIZE + 1)}
+        ),
+        None,
+    )
+
+    assert response["statusCode"] == 400
+
+
+def test_store_secret_values_retries_unprocessed_items(dynamodb_table, monkeypatch):
+    resource = boto3.resource("dynamodb")
+    batch_write_item = resource.batch_write_item
+    calls = []
+
+    def flaky_batch_write_item(RequestItems):
+        calls.append(RequestItems)
+        if len(calls) == 1:
+            # Simulate DynamoDB throttling the last item of the first call
+            ((table_name, requests),) = RequestItems.items()
+            response = batch_write_item(RequestItems={table_name: requests[:-1]})
+            response["UnprocessedItems"] = {table_name: requests[-1:]}
+            return response
+        return batch_write_item(RequestItems=RequestItems)
+
+    resource.batch_write_item = flaky_batch_write_item
+    monkeypatch.setattr(snapsecret.boto3, "resource", lambda *args, **kwargs: resource)
+    monkeypatch.setattr(snapsecret.time, "sleep", lambda seconds: None)
+
+    secret_ids = snapsecret.store_secret_values(["a", "b", "c"])
+
+    assert len(calls) == 2
+    assert [
+        snapsecret.retrieve_secret_value(secret_id) for secret_id in secret_ids
+    ] == [
+        "a",
+        "b",
+        "c",
+    ]
+
+
+def test_secret_bundle_is_retrieved_and_burned_in_one_request(dynamodb_table):
+    bundle = {
+        "salt": "c2FsdA==",
+        "entries": [
+            {"secret": "dXNlcm5hbWU=", "iv": "aXY="},
+            {"secret": "cGFzc3dvcmQ=", "iv": "aXYy"},
+            {"object_key": "key-file_1", "iv": "aXYz", "file_name": "a2V5LnBlbQ=="},
+        ],
+    }
+    response = snapsecret.handler(put_event("/secret", {"secret": bundle}), None)
+    assert response["statusCode"] == 200
+    secret_id = json.loads(response["body"])["secret_id"]
+
+    get_event = {
+        "path": f"/secret/{secret_id}",
+        "httpMethod": "GET",
+        "headers": {},
+        "pathParameters": {"secret_id": secret_id},
+    }
+    response = snapsecret.handler(get_event, None)
+
+    assert response["statusCode"] == 200
+    entries = json.loads(response["body"])["secret"]["entries"]
+    assert [entry.get("secret") for entry in entries[:2]] == [
+        "dXNlcm5hbWU=",
+        "cGFzc3dvcmQ=",
+    ]
+    assert "get_url" not in entries[0]
+    assert "key-file_1" in entries[2]["get_url"]
+    assert "key-file_1" in entries[2]["delete_url"]
+    assert snapsecret.handler(get_event, None)["statusCode"] == 404
+
+
+@pytest.mark.parametrize(
+    "bundle",
+    [
+        {"salt": "c2FsdA==", "entries": []},
+        {"salt": "c2FsdA==", "entries": [{"secret": "not base64!", "iv": "aXY="}]},
+        {
+            "salt": "c2FsdA==",
+            "entries": [{"secret": "c2VjcmV0", "iv": "aXY=", "salt": "eA=="}],
+        },
+        {
+            "salt": "c2FsdA==",
+            "entries": [{"secret": "c2VjcmV0", "iv": "aXY="}]
+            * (snapsecret.MAX_BUNDLE_ENTRIES + 1),
+        },
+        {
+            "salt": "c2FsdA==",
+            "entries": [
+                {"secret": "c2VjcmV0", "iv": "aXY=", "object_key": {"Bucket": "x"}}
+            ],
+        },
+        {
+            "salt": "c2FsdA==",
+            "entries": [
+                {"secret": "c2VjcmV0", "iv": "aXY=", "object_key": "../../other"}
+            ],
+        },
+        {
+            "salt": "c2FsdA==",
+            "entries": [
+                {"object_key": "../../other", "iv": "aXY=", "file_name": "YS50eHQ="}
+            ],
+        },
+    ],
+)
+def test_put_secret_rejects_invalid_bundle(dynamodb_table, bundle):
+    response = snapsecret.handler(put_event("/secret", {"secret": bundle}), None)
+
+    assert response["statusCode"] == 400
+
+
+def test_secret_kdf_descriptor_is_returned_with_secret(dynamodb_table):
+    kdf = {"version": 1, "algorithm": "PBKDF2", "hash": "SHA-512", "iterations": 210000}
+    secret = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA==", "kdf": kdf}
+    response = snapsecret.handler(put_event("/secret", {"secret": secret}), None)
+    assert response["statusCode"] == 200
+    secret_id = json.loads(response["body"])["secret_id"]
+
+    response = snapsecret.handler(
+        {
+            "path": f"/secret/{secret_id}",
+            "httpMethod": "GET",
+            "headers": {},
+            "pathParameters": {"secret_id": secret_id},
+        },
+        None,
+    )
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["secret"]["kdf"] == kdf
+
+
+@pytest.mark.parametrize(
+    "kdf",
+    [
+        {"version": 2, "algorithm": "PBKDF2", "hash": "SHA-256", "iterations": 600000},
+        {"version": 1, "algorithm": "scrypt", "hash": "SHA-256", "iterations": 600000},
+        {"version": 1, "algorithm": "PBKDF2", "hash": "SHA-1", "iterations": 600000},
+        {
+            "version": 1,
+            "algorithm": "PBKDF2",
+            "hash": ["SHA-256"],
+            "iterations": 600000,
+        },
+        {"version": 1, "algorithm": "PBKDF2", "hash": "SHA-256", "iterations": 1000},
+        {
+            "version": 1,
+            "algorithm": "PBKDF2",
+            "hash": "SHA-256",
+            "iterations": "600000",
+        },
+        {"version": 1, "algorithm": "PBKDF2", "hash": "SHA-256"},
+        "PBKDF2",
+    ],
+)
+def test_put_secret_rejects_invalid_kdf(dynamodb_table, kdf):
+    secret = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA==", "kdf": kdf}
+    response = snapsecret.handler(put_event("/secret", {"secret": secret}), None)
+
+    assert response["statusCode"] == 400
+
+
+def test_get_new_file_batch_mints_distinct_upload_slots(dynamodb_table, monkeypatch):
+    client = snapsecret.boto3.client
+    clients = []
+    monkeypatch.setattr(
+        snapsecret.boto3,
+        "client",
+        lambda *args, **kwargs: clients.append(client(*args, **kwargs)) or clients[-1],
+    )
+
+    response = snapsecret.handler(
+        {
+            "path": "/file/new/batch",
+            "httpMethod": "GET",
+            "headers": {},
+            "queryStringParameters": {"count": "3"},
+        },
+        None,
+    )
+
+    assert response["statusCode"] == 200
+    files = json.loads(response["body"])["files"]
+    assert len({file["object_key"] for file in files}) == 3
+    assert len(clients) == 1
+    for file in files:
+        assert file["post"]["fields"]["key"] == file["object_key"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [None, {}, {"count": "0"}, {"count": "abc"}, {"count": "²"}, {"count": "1000"}],
+)
+def test_get_new_file_batch_rejects_invalid_count(dynamodb_table, query):
+    response = snapsecret.handler(
+        {
+            "path": "/file/new/batch",
+            "httpMethod": "GET",
+            "headers": {},
+            "queryStringParameters": query,
+        },
+        None,
+    )
+
+    assert response["statusCode"] == 400
+
+
+def test_file_bundle_returns_urls_for_every_file(dynamodb_table):
+    secret = {
+        "salt": "c2FsdA==",
+        "entries": [
+            {"object_key": "file_1", "iv": "aXY=", "file_name": "YS50eHQ="},
+            {
+                "object_key": "file_2",
+                "iv": "aXYy",
+                "file_name": "Yi50eHQ=",
+                "file_iv_prefix": "cHJlZml4",
+            },
+        ],
+    }
+    response = snapsecret.handler(put_event("/secret", {"secret": secret}), None)
+    assert response["statusCode"] == 200
+    secret_id = json.loads(response["body"])["secret_id"]
+
+    response = snapsecret.handler(
+        {
+            "path": f"/secret/{secret_id}",
+            "httpMethod": "GET",
+            "headers": {},
+            "pathParameters": {"secret_id": secret_id},
+        },
+        None,
+    )
+
+    assert response["statusCode"] == 200
+    entries = json.loads(response["body"])["secret"]["entries"]
+    for entry, object_key in zip(entries, ("file_1", "file_2")):
+        assert object_key in entry["get_url"]
+        assert object_key in entry["delete_url"]
+
+
+def test_put_secret_rejects_bundle_with_duplicate_object_keys(dynamodb_table):
+    entry = {"object_key": "file_1", "iv": "aXY=", "file_name": "YS50eHQ="}
+    secret = {"salt": "c2FsdA==", "entries": [entry, {**entry, "iv": "aXYy"}]}
+    response = snapsecret.handler(put_event("/secret", {"secret": secret}), None)
+
+    assert response["statusCode"] == 400
+
+
+def test_put_secret_batch_rejects_only_oversized_secret(dynamodb_table):
+    valid = {"secret": "c2VjcmV0", "iv": "aXY=", "salt": "c2FsdA=="}
+    oversized = {**valid, "secret": "A" * snapsecret.MAX_ITEM_SIZE_BYTES}
+    response = snapsecret.handler(
+        put_event("/secret/batch", {"secrets": [valid] * 30 + [oversized]}), None
+    )
+
+    assert response["statusCode"] == 200
+    results = json.loads(response["body"])["secrets"]
+    assert results[30] == {"error": "Secret value too large"}
+    assert all("secret_id" in result for result in results[:30])
+    assert dynamodb_table.scan()["Count"] == 30
+
+
+def test_store_secret_values_reports_failed_chunk(dynamodb_table, monkeypatch):
+    resource = boto3.resource("dynamodb")
+    batch_write_item = resource.batch_write_item
+    calls = []
+
+    def failing_batch_write_item(RequestItems):
+        calls.append(RequestItems)
+        if len(calls) == 2:
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": "Injected"}},
+                "BatchWriteItem",
+            )
+        return batch_write_item(RequestItems=RequestItems)
+
+    resource.batch_write_item = failing_batch_write_item
+    monkeypatch.setattr(snapsecret.boto3, "resource", lambda *args, **kwargs: resource)
+
+    chunk_size = snapsecret.BATCH_WRITE_CHUNK_SIZE
+    secret_ids = snapsecret.store_secret_values(["a"] * (chunk_size + 1))
+
+    assert None not in secret_ids[:chunk_size]
+    assert secret_ids[chunk_size] is None
+
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms: int):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self.remaining_ms
+
+
+def test_store_secret_values_stops_retrying_near_timeout(dynamodb_table, monkeypatch):
+    resource = boto3.resource("dynamodb")
+    batch_write_item = resource.batch_write_item
+    calls = []
+
+    def throttled_batch_write_item(RequestItems):
+        # Simulate DynamoDB throttling the last item of every call
+        calls.append(RequestItems)
+        ((table_name, requests),) = RequestItems.items()
+        response = batch_write_item(RequestItems={table_name: requests[:-1]})
+        response["UnprocessedItems"] = {table_name: requests[-1:]}
+        return response
+
+    resource.batch_write_item = throttled_batch_write_item
+    monkeypatch.setattr(snapsecret.boto3, "resource", lambda *args, **kwargs: resource)
+    monkeypatch.setattr(snapsecret.time, "sleep", lambda seconds: None)
+
+    context = FakeLambdaContext(snapsecret.BATCH_WRITE_MIN_REMAINING_MS + 50)
+    secret_ids = snapsecret.store_secret_values(["a", "b", "c"], context=context)
+
+    assert len(calls) == 1
+    assert secret_ids[2] is None
+    assert [
+        snapsecret.retrieve_secret_value(secret_id) for secret_id in secret_ids[:2]
+    ] == [
+        "a",
+        "b",
+    ]
+
+
+def test_secret_bundle_signs_every_file_with_one_s3_client(dynamodb_table, monkeypatch):
+    entries = [
+        {"object_key": f"file_{index}", "iv": "aXY=", "file_name": "YS50eHQ="}
+        for index in range(3)
+    ]
+    secret_id = snapsecret.store_secret_value({"salt": "c2FsdA==", "entries": entries})
+
+    client = snapsecret.boto3.client
+    clients = []
+    monkeypatch.setattr(
+        snapsecret.boto3,
+        "client",
+        lambda *args, **kwargs: clients.append(client(*args, **kwargs)) or clients[-1],
+    )
+
+    response = snapsecret.handler(
+        {
+            "path": f"/secret/{secret_id}",
+            "httpMethod": "GET",
+            "headers": {},
+            "pathParameters": {"secret_id": secret_id},
+        },
+        None,
+    )
+
+    assert response["statusCode"] == 200
+    assert len(clients) == 1
+    for entry in json.loads(response["body"])["secret"]["entries"]:
+        assert entry["object_key"] in entry["get_url"]